@@ -1,12 +1,113 @@
 #!/usr/bin/env python3
 import struct
-import io
+import re
+import sys
+import array
+import mmap
 import argparse
+import collections.abc
+from operator import itemgetter
 
-class DolDocError(BaseException):
+#Keep BitMap pixels as a view of the source until .data is first read
+LAZY_BITMAP = True
+
+#Int32 fields are read straight into array('i')
+if array.array("i").itemsize != 4:
+    raise ImportError("DolDoc needs a 4 byte array('i')")
+
+class DolDocError(Exception):
     pass
 
+def readStream(stream, parse):
+    #Runs a buffer parser for the old stream API. Reads in growing blocks
+    #until parse has enough, then gives back the bytes it didn't use:
+    #seekable streams seek back, others are only peeked at if they can be.
+    seekable = stream.seekable()
+    if not seekable and hasattr(stream, "peek"):
+        data = stream.peek(1 << 16)
+        try:
+            result, off = parse(memoryview(data))
+        except (DolDocError, struct.error, IndexError):
+            pass
+        else:
+            stream.read(off)
+            return result
+    
+    data = b""
+    block = 4096
+    while True:
+        more = stream.read(block) or b""
+        data += more
+        try:
+            result, off = parse(memoryview(data))
+            break
+        except (DolDocError, struct.error, IndexError):
+            if not more:
+                raise
+        block *= 2
+    
+    unused = len(data) - off
+    if unused:
+        if not seekable:
+            raise DolDocError(f"Can't give {unused} bytes back to the stream!")
+        stream.seek(-unused, 1)
+    return result
+
+class DolDocRows(collections.abc.Sequence):
+    #Sequence of fixed-width int32 tuples backed by one flat array
+    def __init__(self, width, data = None):
+        self.width = width
+        self.data = data if data is not None else array.array("i")
+    
+    def __len__(self):
+        return len(self.data) // self.width
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            #Slices come back as plain lists of rows, like the old lists did
+            return [self[j] for j in range(*i.indices(len(self)))]
+        count = len(self)
+        if i < 0:
+            i += count
+        if not 0 <= i < count:
+            raise IndexError("row index out of range")
+        i *= self.width
+        return tuple(self.data[i:i + self.width])
+    
+    def __iter__(self):
+        #Group the flat array into tuples in C
+        return zip(*[iter(self.data)] * self.width)
+    
+    def __eq__(self, other):
+        if isinstance(other, DolDocRows):
+            return self.width == other.width and self.data == other.data
+        if isinstance(other, collections.abc.Sequence) \
+                and not isinstance(other, (str, bytes)):
+            return list(self) == list(other)
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"<DolDocRows {len(self)}x{self.width}>"
+    
+    @classmethod
+    def fromBuffer(cls, width, buf, off, count):
+        size = count * width * 4
+        if count < 0 or off + size > len(buf):
+            raise DolDocError(f"Truncated array at {off}!")
+        data = array.array("i")
+        data.frombytes(memoryview(buf)[off:off + size])
+        if sys.byteorder == "big":
+            data.byteswap()
+        return cls(width, data), off + size
+
 class DolDocElement:
+    __slots__ = ("name", "id")
+    
+    #Struct covering the whole payload, for elements with a fixed layout
+    sFixed = None
+    
     def __init__(self, name, id):
         self.name = name
         self.id = id
@@ -15,148 +116,137 @@ class DolDocElement:
         return self.name
     
     def __repr__(self):
-        return "<DolDocElement {}>".format(self)
+        return f"<DolDocElement {self}>"
+    
+    @classmethod
+    def fromBuffer(cls, name, id, buf, off):
+        if cls.sFixed is None:
+            return cls(name, id), off
+        return cls(name, id, *cls.sFixed.unpack_from(buf, off)), \
+            off + cls.sFixed.size
     
     @classmethod
     def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        return self
+        return readStream(stream, lambda buf: cls.fromBuffer(name, id, buf, 0))
     
     @classmethod
     def fromBytes(cls, name, id, data):
-        buffer = io.BytesIO(data)
-        buffer.seek(0)
-        return cls.fromStream(name, id, buffer)
+        return cls.fromBuffer(name, id, memoryview(data), 0)[0]
 
 class DolDocElementEnd(DolDocElement):
+    __slots__ = ()
+    
     def __str__(self):
         return "END"
 
 class DolDocElementColor(DolDocElement):
+    __slots__ = ("color",)
+    
     colors = [
         "BLACK", "BLUE", "GREEN", "CYAN", "RED", "PURPLE",
         "BROWN", "LTGRAY", "DKGRAY", "LTBLUE", "LTGREEN",
         "LTCYAN", "LTRED", "LTPURPLE", "YELLOW", "WHITE"
     ]
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.color = 0
+    def __init__(self, name, id, color=0):
+        super().__init__(name, id)
+        self.color = color
     
     def __str__(self):
-        return "{} {}".format(self.name, self.colors[self.color])
+        return f"{self.name} {self.colors[self.color]}"
     
     @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.color, = stream.read(1)
-        return self
+    def fromBuffer(cls, name, id, buf, off):
+        return cls(name, id, buf[off]), off + 1
 
 class DolDocElementDitherColor(DolDocElement):
+    __slots__ = ("color1", "color2")
+    
     colors = [
         "BLACK", "BLUE", "GREEN", "CYAN", "RED", "PURPLE",
         "BROWN", "LTGRAY", "DKGRAY", "LTBLUE", "LTGREEN",
         "LTCYAN", "LTRED", "LTPURPLE", "YELLOW", "WHITE"
     ]
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.color1 = 0
-        self.color2 = 0
+    def __init__(self, name, id, color1=0, color2=0):
+        super().__init__(name, id)
+        self.color1 = color1
+        self.color2 = color2
     
     def __str__(self):
-        return "{} {}/{}".format(self.name, self.colors[self.color1], self.colors[self.color2])
+        return f"{self.name} {self.colors[self.color1]}/{self.colors[self.color2]}"
     
     @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.color1, self.color2 = stream.read(2)
-        return self
+    def fromBuffer(cls, name, id, buf, off):
+        return cls(name, id, buf[off], buf[off + 1]), off + 2
 
 class DolDocElementCircle(DolDocElement):
+    __slots__ = ("x", "y", "radius")
+    
     #X, Y, Radius
     sCircle = struct.Struct("<iii")
+    sFixed = sCircle
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x = 0
-        self.y = 0
-        self.radius = 0
+    def __init__(self, name, id, x=0, y=0, radius=0):
+        super().__init__(name, id)
+        self.x = x
+        self.y = y
+        self.radius = radius
     
     def __str__(self):
-        return "{} ({}, {}):{}R".format(self.name, self.x, self.y, self.radius)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x, self.y, self.radius = self.sCircle.unpack(
-            stream.read(self.sCircle.size)
-        )
-        return self
+        return f"{self.name} ({self.x}, {self.y}):{self.radius}R"
 
 class DolDocElementLine(DolDocElement):
+    __slots__ = ("x1", "y1", "x2", "y2")
+    
     #X1, Y1, X2, Y2
     sLine = struct.Struct("<iiii")
+    sFixed = sLine
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x1 = 0
-        self.y1 = 0
-        self.x2 = 0
-        self.y2 = 0
+    def __init__(self, name, id, x1=0, y1=0, x2=0, y2=0):
+        super().__init__(name, id)
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
     
     def __str__(self):
-        return "{} ({}, {}), ({}, {})".format(self.name, self.x1, self.y1, self.x2, self.y2)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x1, self.y1, self.x2, self.y2 = \
-            self.sLine.unpack(
-                stream.read(self.sLine.size)
-            )
-        return self
+        return f"{self.name} ({self.x1}, {self.y1}), ({self.x2}, {self.y2})"
 
 class DolDocElementFloodFill(DolDocElement):
+    __slots__ = ("x", "y")
+    
     #X, Y
     sFloodFill = struct.Struct("<ii")
+    sFixed = sFloodFill
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x = 0
-        self.y = 0
+    def __init__(self, name, id, x=0, y=0):
+        super().__init__(name, id)
+        self.x = x
+        self.y = y
     
     def __str__(self):
-        return "{} ({}, {})".format(self.name, self.x, self.y)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x, self.y = self.sFloodFill.unpack(
-            stream.read(self.sFloodFill.size)
-        )
-        return self
+        return f"{self.name} ({self.x}, {self.y})"
 
 class DolDocElementThick(DolDocElement):
+    __slots__ = ("thickness",)
+    
     #Thickness
     sThickness = struct.Struct("<i")
+    sFixed = sThickness
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.thickness = 0
+    def __init__(self, name, id, thickness=0):
+        super().__init__(name, id)
+        self.thickness = thickness
     
     def __str__(self):
-        return "{} {}".format(self.name, self.thickness)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.thickness, = self.sThickness.unpack(
-            stream.read(self.sThickness.size)
-        )
-        return self
+        return f"{self.name} {self.thickness}"
 
 class DolDocElementMesh(DolDocElement):
+    __slots__ = ("vertices", "triangles")
+    
     #Vertice count, Triangle count
     sMeshHeader = struct.Struct("<ii")
+    sMeshHeaderSize = sMeshHeader.size
+    sMeshHeaderUnpackFrom = sMeshHeader.unpack_from
     
     #X, Y, Z
     sVertex = struct.Struct("<iii")
@@ -166,54 +256,57 @@ class DolDocElementMesh(DolDocElement):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.vertices = []
-        self.triangles = []
+        self.vertices = DolDocRows(3)
+        self.triangles = DolDocRows(4)
     
     def __str__(self):
-        return "{} {}V,{}T".format(self.name, len(self.vertices), len(self.triangles))
+        return f"{self.name} {len(self.vertices)}V,{len(self.triangles)}T"
+    
+    def vertexCount(self):
+        return len(self.vertices)
+    
+    def triangleCount(self):
+        return len(self.triangles)
+    
+    def vertex(self, i):
+        return self.vertices[i]
+    
+    def triangle(self, i):
+        return self.triangles[i]
     
     @classmethod
-    def fromStream(cls, name, id, stream):
+    def fromBuffer(cls, name, id, buf, off):
         self = cls(name, id)
-        vertex_cnt, tri_cnt = self.sMeshHeader.unpack(
-            stream.read(self.sMeshHeader.size)
-        )
-        self.vertices = [None] * vertex_cnt
-        for i in range(vertex_cnt):
-            self.vertices[i] = self.sVertex.unpack(
-                stream.read(self.sVertex.size)
-            )
-        
-        self.triangles = [None] * tri_cnt
-        for i in range(tri_cnt):
-            self.triangles[i] = self.sTriangle.unpack(
-                stream.read(self.sTriangle.size)
-            )
-        return self
+        vertex_cnt, tri_cnt = self.sMeshHeaderUnpackFrom(buf, off)
+        off += self.sMeshHeaderSize
+        self.vertices, off = DolDocRows.fromBuffer(3, buf, off, vertex_cnt)
+        self.triangles, off = DolDocRows.fromBuffer(4, buf, off, tri_cnt)
+        return self, off
 
 class DolDocElementPoint(DolDocElement):
+    __slots__ = ("x", "y")
+    
     #X, Y
     sPoint = struct.Struct("<ii")
+    sFixed = sPoint
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x = 0
-        self.y = 0
+    def __init__(self, name, id, x=0, y=0):
+        super().__init__(name, id)
+        self.x = x
+        self.y = y
     
     def __str__(self):
-        return "{} ({},{})".format(self.name, self.x, self.y)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x, self.y = self.sPoint.unpack(
-            stream.read(self.sPoint.size)
-        )
-        return self
+        return f"{self.name} ({self.x},{self.y})"
 
 class DolDocElementText(DolDocElement):
+    __slots__ = ("x", "y", "text")
+    
     #X, Y
     sTextHeader = struct.Struct("<ii")
+    sTextHeaderSize = sTextHeader.size
+    sTextHeaderUnpackFrom = sTextHeader.unpack_from
+    #Terminator, searchable in any buffer (bytes, memoryview, mmap)
+    reTextEnd = re.compile(b"\0")
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -222,27 +315,28 @@ class DolDocElementText(DolDocElement):
         self.text = b""
     
     def __str__(self):
-        return "{} {},{}:{}".format(self.name, self.x, self.y, self.text)
+        return f"{self.name} {self.x},{self.y}:{self.text}"
     
     @classmethod
-    def fromStream(cls, name, id, stream):
+    def fromBuffer(cls, name, id, buf, off):
         self = cls(name, id)
-        self.x, self.y = self.sTextHeader.unpack(
-            stream.read(self.sTextHeader.size)
-        )
-        self.text = b""
-        while True:
-            v = stream.read(1)
-            if v == b"\0":
-                break
-            self.text += v
-        
-        return self
+        self.x, self.y = self.sTextHeaderUnpackFrom(buf, off)
+        off += self.sTextHeaderSize
+        match = self.reTextEnd.search(buf, off)
+        if match is None:
+            raise DolDocError(f"Unterminated text at {off}!")
+        end = match.start()
+        self.text = bytes(buf[off:end])
+        return self, end + 1
 
 
 class DolDocElementBitMap(DolDocElement):
+    __slots__ = ("x", "y", "width", "height", "pixels", "raw")
+    
     #X, Y, Width, Height
     sBitMapHeader = struct.Struct("<iiii")
+    sBitMapHeaderSize = sBitMapHeader.size
+    sBitMapHeaderUnpackFrom = sBitMapHeader.unpack_from
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -250,250 +344,285 @@ class DolDocElementBitMap(DolDocElement):
         self.y = 0
         self.width = 0
         self.height = 0
-        self.data = []
+        self.data = b""
     
     def __str__(self):
-        return "{} ({},{}):{}W,{}H".format(self.name, self.x, self.y, self.width, self.height)
+        return f"{self.name} ({self.x},{self.y}):{self.width}W,{self.height}H"
+    
+    @property
+    def stride(self):
+        #Rows are padded to a multiple of 8 pixels, one byte per pixel
+        return (self.width + 7) & ~7
+    
+    def decode(self):
+        if self.raw is None:
+            return self.pixels
+        stride = self.stride
+        if stride == self.width:
+            return bytes(self.raw)
+        return b"".join(
+            self.raw[row:row + self.width]
+            for row in range(0, stride * self.height, stride)
+        )
+    
+    def pixel(self, x, y):
+        return self.data[y * self.width + x]
+    
+    @property
+    def data(self):
+        if self.raw is not None:
+            self.data = self.decode()
+        return self.pixels
+    
+    @data.setter
+    def data(self, value):
+        self.pixels = value
+        self.raw = None
+    
+    def __getstate__(self):
+        #Views into a document can't be pickled, hand over decoded pixels
+        pixels = self.data
+        state = {
+            slot: getattr(self, slot)
+            for klass in type(self).__mro__
+            for slot in getattr(klass, "__slots__", ())
+            if hasattr(self, slot)
+        }
+        state["pixels"] = pixels
+        state["raw"] = None
+        return None, state
     
     @classmethod
-    def fromStream(cls, name, id, stream):
+    def fromBuffer(cls, name, id, buf, off):
         self = cls(name, id)
-        self.x, self.y, self.width, self.height = self.sBitMapHeader.unpack(
-            stream.read(self.sBitMapHeader.size)
-        )
-        self.data = list(stream.read(self.width*self.height))
-        return self
+        self.x, self.y, self.width, self.height = self.sBitMapHeaderUnpackFrom(buf, off)
+        off += self.sBitMapHeaderSize
+        end = off + self.stride * self.height
+        if self.width < 0 or self.height < 0 or end > len(buf):
+            raise DolDocError(f"Bad bitmap at {off}!")
+        self.raw = memoryview(buf)[off:end]
+        if not LAZY_BITMAP:
+            self.data = self.decode()
+        return self, end
 
 
 class DolDocElementArrow(DolDocElement):
+    __slots__ = ("x1", "y1", "x2", "y2")
+    
     #X1, Y1, X2, Y2
     sArrow = struct.Struct("<iiii")
+    sFixed = sArrow
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x1 = 0
-        self.y1 = 0
-        self.x2 = 0
-        self.y2 = 0
+    def __init__(self, name, id, x1=0, y1=0, x2=0, y2=0):
+        super().__init__(name, id)
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
     
     def __str__(self):
-        return "{} ({}, {}), ({}, {})".format(self.name, self.x1, self.y1, self.x2, self.y2)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x1, self.y1, self.x2, self.y2 = \
-            self.sArrow.unpack(
-                stream.read(self.sArrow.size)
-            )
-        return self
+        return f"{self.name} ({self.x1}, {self.y1}), ({self.x2}, {self.y2})"
 
 class DolDocElementPlanarSymmetry(DolDocElement):
+    __slots__ = ("x1", "y1", "x2", "y2")
+    
     #X1, Y1, X2, Y2
     sPlanarSymmetry = struct.Struct("<iiii")
+    sFixed = sPlanarSymmetry
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x1 = 0
-        self.y1 = 0
-        self.x2 = 0
-        self.y2 = 0
+    def __init__(self, name, id, x1=0, y1=0, x2=0, y2=0):
+        super().__init__(name, id)
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
     
     def __str__(self):
-        return "{} ({}, {}), ({}, {})".format(self.name, self.x1, self.y1, self.x2, self.y2)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x1, self.y1, self.x2, self.y2 = \
-            self.sPlanarSymmetry.unpack(
-                stream.read(self.sPlanarSymmetry.size)
-            )
-        return self
+        return f"{self.name} ({self.x1}, {self.y1}), ({self.x2}, {self.y2})"
 
 class DolDocElementRect(DolDocElement):
+    __slots__ = ("x1", "y1", "x2", "y2")
+    
     #X1, Y1, X2, Y2
     sRect = struct.Struct("<iiii")
+    sFixed = sRect
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x1 = 0
-        self.y1 = 0
-        self.x2 = 0
-        self.y2 = 0
+    def __init__(self, name, id, x1=0, y1=0, x2=0, y2=0):
+        super().__init__(name, id)
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
     
     def __str__(self):
-        return "{} ({}, {}), ({}, {})".format(self.name, self.x1, self.y1, self.x2, self.y2)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x1, self.y1, self.x2, self.y2 = \
-            self.sRect.unpack(
-                stream.read(self.sRect.size)
-            )
-        return self
+        return f"{self.name} ({self.x1}, {self.y1}), ({self.x2}, {self.y2})"
 
 class DolDocElementEllipse(DolDocElement):
+    __slots__ = ("x", "y", "width", "height", "angle")
+    
     #X, Y, Width, Height, Angle(Radians)
     sEllipse = struct.Struct("<iiiid")
+    sFixed = sEllipse
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x = 0
-        self.y = 0
-        self.width = 0
-        self.height = 0
-        self.angle = 0
+    def __init__(self, name, id, x=0, y=0, width=0, height=0, angle=0):
+        super().__init__(name, id)
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.angle = angle
     
     def __str__(self):
-        return "{} ({}, {}):{}W,{}H".format(self.name, self.x, self.y, self.width, self.height)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x, self.y, self.width, self.height, self.angle = \
-            self.sEllipse.unpack(
-                stream.read(self.sEllipse.size)
-            )
-        return self
+        return f"{self.name} ({self.x}, {self.y}):{self.width}W,{self.height}H"
 
 class DolDocElementPolygon(DolDocElement):
+    __slots__ = ("x", "y", "width", "height", "angle", "sides")
+    
     #X, Y, Width, Height, Angle, Sides
     sPolygon = struct.Struct("<iiiidi")
+    sFixed = sPolygon
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x = 0
-        self.y = 0
-        self.width = 0
-        self.height = 0
-        self.angle = 0
-        self.sides = 0
+    def __init__(self, name, id, x=0, y=0, width=0, height=0, angle=0, sides=0):
+        super().__init__(name, id)
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.angle = angle
+        self.sides = sides
     
     def __str__(self):
-        return "{} ({}, {}):{}W,{}H".format(self.name, self.x, self.y, self.width, self.height)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x, self.y, self.width, self.height, self.angle, self.sides = \
-            self.sPolygon.unpack(
-                stream.read(self.sPolygon.size)
-            )
-        return self
+        return f"{self.name} ({self.x}, {self.y}):{self.width}W,{self.height}H"
 
 class DolDocElementPolyLine(DolDocElement):
+    __slots__ = ("points",)
+    
     #Count
     sPolyLineCount = struct.Struct("<i")
+    sPolyLineCountSize = sPolyLineCount.size
+    sPolyLineCountUnpackFrom = sPolyLineCount.unpack_from
     #X, Y
     sPolyLinePoint = struct.Struct("<ii")
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.points = []
+        self.points = DolDocRows(2)
     
     def __str__(self):
-        return "{} {} ({}, {})".format(self.name, len(self.points), *(self.points or [(0,0)])[0])
+        x, y = (self.points or [(0, 0)])[0]
+        return f"{self.name} {len(self.points)} ({x}, {y})"
     
     @classmethod
-    def fromStream(cls, name, id, stream):
+    def fromBuffer(cls, name, id, buf, off):
         self = cls(name, id)
-        count, = self.sPolyLineCount.unpack(
-            stream.read(self.sPolyLineCount.size)
-        )
-        self.points = [None] * count
-        for i in range(count):
-            self.points[i] = self.sPolyLinePoint.unpack(
-                stream.read(self.sPolyLinePoint.size)
-            )
-        return self
+        count, = self.sPolyLineCountUnpackFrom(buf, off)
+        off += self.sPolyLineCountSize
+        self.points, off = DolDocRows.fromBuffer(2, buf, off, count)
+        return self, off
 
 class DolDocElementPolyPt(DolDocElement):
-    #TODO: Implement properly
-    #X, Y, Count
+    __slots__ = ("x", "y", "points")
+    
+    #Count, X, Y
     sPolyPtHeader = struct.Struct("<iii")
+    sPolyPtHeaderSize = sPolyPtHeader.size
+    sPolyPtHeaderUnpackFrom = sPolyPtHeader.unpack_from
+    
+    #Each point is a 3 bit step from the previous one, indexing these
+    xOffsets = (-1, 0, 1, -1, 1, -1, 0, 1)
+    yOffsets = (-1, -1, -1, 0, 0, 1, 1, 1)
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.points = []
+        self.x = 0
+        self.y = 0
+        self.points = DolDocRows(2)
     
     def __str__(self):
-        return "{} {} ({}, {})".format(self.name, len(self.points), *(self.points or [(0,0)])[0])
+        x, y = (self.points or [(0, 0)])[0]
+        return f"{self.name} {len(self.points)} ({x}, {y})"
     
     @classmethod
-    def fromStream(cls, name, id, stream):
+    def fromBuffer(cls, name, id, buf, off):
         self = cls(name, id)
-        self.x, self.y, count = \
-            self.sPolyPtHeader.unpack(
-                stream.read(self.sPolyPtHeader.size)
-            )
-        self.points = []
-        stream.read(count*3)
-        return self
+        count, self.x, self.y = \
+            self.sPolyPtHeaderUnpackFrom(buf, off)
+        off += self.sPolyPtHeaderSize
+        end = off + ((count * 3 + 7) >> 3)
+        if count < 0 or end > len(buf):
+            raise DolDocError(f"Truncated points at {off}!")
+        
+        xOffsets = self.xOffsets
+        yOffsets = self.yOffsets
+        coords = array.array("i", [0]) * (2 * count)
+        x = self.x
+        y = self.y
+        bits = 0
+        nbits = 0
+        for i in range(0, 2 * count, 2):
+            if nbits < 3:
+                bits |= buf[off] << nbits
+                off += 1
+                nbits += 8
+            step = bits & 7
+            bits >>= 3
+            nbits -= 3
+            x += xOffsets[step]
+            y += yOffsets[step]
+            coords[i] = x
+            coords[i + 1] = y
+        self.points = DolDocRows(2, coords)
+        return self, end
 
 
 class DolDocElementBSpline(DolDocElement):
+    __slots__ = ("points",)
+    
     #Count
     sBSplineCount = struct.Struct("<i")
+    sBSplineCountSize = sBSplineCount.size
+    sBSplineCountUnpackFrom = sBSplineCount.unpack_from
     #X, Y, Angle
     sBSplinePoint = struct.Struct("<iii")
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.points = []
+        self.points = DolDocRows(3)
     
     def __str__(self):
-        return "{} {}".format(self.name, len(self.points))
+        return f"{self.name} {len(self.points)}"
     
     @classmethod
-    def fromStream(cls, name, id, stream):
+    def fromBuffer(cls, name, id, buf, off):
         self = cls(name, id)
         count, = \
-            self.sBSplineCount.unpack(
-                stream.read(self.sBSplineCount.size)
-            )
-        self.points = [None] * count
-        for i in range(count):
-            self.points[i] =  self.sBSplinePoint.unpack(
-                stream.read(self.sBSplinePoint.size)
-            )
-        return self
+            self.sBSplineCountUnpackFrom(buf, off)
+        off += self.sBSplineCountSize
+        self.points, off = DolDocRows.fromBuffer(3, buf, off, count)
+        return self, off
 
 
 class DolDocElementTransform(DolDocElement):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    __slots__ = ()
     
     def __str__(self):
-        return "{}".format(self.name)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        return self
+        return f"{self.name}"
 
 
 class DolDocElementShift(DolDocElement):
+    __slots__ = ("x", "y")
+    
     #X, Y
     sShift = struct.Struct("<ii")
+    sFixed = sShift
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.x = 0
-        self.y = 0
+    def __init__(self, name, id, x=0, y=0):
+        super().__init__(name, id)
+        self.x = x
+        self.y = y
     
     def __str__(self):
-        return "{} ({}, {})".format(self.name, self.x, self.y)
-    
-    @classmethod
-    def fromStream(cls, name, id, stream):
-        self = cls(name, id)
-        self.x, self.y = \
-            self.sShift.unpack(
-                stream.read(self.sShift.size)
-            )
-        return self
+        return f"{self.name} ({self.x}, {self.y})"
 
 DolDocTypes = {
     "End": DolDocElementEnd,
@@ -502,7 +631,7 @@ DolDocTypes = {
     "Thick": DolDocElementThick,
     "PlanarSymmetry": DolDocElementPlanarSymmetry,
     "Transform": DolDocElementTransform,
-    #"Shift": DolDocShift,
+    "Shift": DolDocElementShift,
     "Pt": DolDocElementPoint,
     "PolyPt": DolDocElementPolyPt,
     "Line": DolDocElementLine,
@@ -555,74 +684,202 @@ DolDocMapping = [
     ('Text Diamond', 'TextDiamond')
 ]
 
+def dispatchEntry(name, cls):
+    #Fixed layouts are decoded inline by the entry loop: (name, cls, unpack, size).
+    #Everything else goes through its parser: (name, fromBuffer, None, 0).
+    if cls.sFixed is not None:
+        return (name, cls, cls.sFixed.unpack_from, cls.sFixed.size)
+    return (name, cls.fromBuffer, None, 0)
+
+def unknownElement(name, id, buf, off):
+    raise DolDocError(f"Don't know what type {id} at {off} is!")
+
+#Indexed by any element type byte, unknown types land on unknownElement.
+#Every mapped type must have a decoder, checked here rather than per element.
+DolDocDispatch = tuple([
+    dispatchEntry(name, DolDocTypes[key])
+    for name, key in DolDocMapping
+] + [(None, unknownElement, None, 0)] * (256 - len(DolDocMapping)))
+
 class DolDocEntry:
-    def __init__(self):
-        self.elements = []
+    def __init__(self, elements = None):
+        self.elements = elements or []
+    
+    @staticmethod
+    def walkBuffer(buf, off=0):
+        #The one element walker: yields each element with the offset after it
+        end = len(buf)
+        try:
+            while True:
+                if off >= end:
+                    raise DolDocError("EOF reached before End marker!")
+                etype = buf[off]
+                off += 1
+                
+                if etype == 0:
+                    #End marker, no payload to dispatch on
+                    yield DolDocElementEnd("End", etype), off
+                    return
+                
+                name, parse, unpack, size = DolDocDispatch[etype]
+                if unpack is None:
+                    elm, off = parse(name, etype, buf, off)
+                else:
+                    elm = parse(name, etype, *unpack(buf, off))
+                    off += size
+                yield elm, off
+        except (struct.error, IndexError) as e:
+            #Fixed fields read past the end of a truncated payload
+            raise DolDocError(f"Truncated {name} at {off}!") from e
+    
+    @classmethod
+    def fromBuffer(cls, buf, off=0):
+        elements = []
+        append = elements.append
+        for elm, off in cls.walkBuffer(buf, off):
+            append(elm)
+        return cls(elements), off
+    
+    @classmethod
+    def iterFromBuffer(cls, buf, off=0):
+        #Hands each element over without keeping it
+        return map(itemgetter(0), cls.walkBuffer(buf, off))
+    
+    @classmethod
+    def iterFromBytes(cls, data):
+        return cls.iterFromBuffer(memoryview(data))
     
     @classmethod
     def fromStream(cls, stream):
-        self = cls()
-        i = 0
-        while True:
-            try:
-                etype = stream.read(1)[0]
-            except IndexError:
-                raise DolDocError("EOF reached before End marker!")
-            
-            if etype > len(DolDocMapping):
-                raise DolDocError("Don't know what type {} at {} is!".format(etype, stream.tell()))
-            
-            name = DolDocMapping[etype][0]
-            cls = DolDocMapping[etype][1]
-            if cls not in DolDocTypes:
-                raise DolDocError("Don't know how to decode {} at {}!".format(cls, stream.tell()))
-            
-            elm = DolDocTypes[cls].fromStream(name, etype, stream)
-            print(elm)
-            self.elements.append(elm)
-            if elm.name == "End":
-                break
-        
-        return self
+        return readStream(stream, cls.fromBuffer)
     
     @classmethod
     def fromBytes(cls, data):
-        buffer = io.BytesIO(data)
-        buffer.seek(0)
-        return cls.fromStream(buffer)
+        return cls.fromBuffer(memoryview(data))[0]
+
+class DolDocLazyEntry:
+    #Holds a chunk payload and only decodes it on first access
+    def __init__(self, raw):
+        self.raw = raw
+        self.parsed = None
+    
+    def parse(self):
+        if self.parsed is None:
+            self.parsed = DolDocEntry.fromBuffer(self.raw)[0]
+            self.raw = None
+        return self.parsed
+    
+    def detach(self):
+        #Copies out everything still viewing the source document
+        if self.parsed is None:
+            self.raw = bytes(self.raw)
+            return
+        for elm in self.parsed.elements:
+            if isinstance(elm, DolDocElementBitMap) and elm.raw is not None:
+                elm.data = elm.decode()
+    
+    def __getstate__(self):
+        #Payload views can't be pickled, so copies carry the parsed entry
+        return {"raw": None, "parsed": self.parse()}
+    
+    def iterElements(self):
+        if self.parsed is not None:
+            return iter(self.parsed.elements)
+        return DolDocEntry.iterFromBuffer(self.raw)
+    
+    @property
+    def entry(self):
+        return self.parse()
+    
+    @property
+    def elements(self):
+        return self.parse().elements
 
 class DolDoc:
     sDolDocEntry = struct.Struct("<IIII")
+    sDolDocEntrySize = sDolDocEntry.size
+    sDolDocEntryUnpackFrom = sDolDocEntry.unpack_from
     def __init__(self, text = "", chunks = None):
         self.text = text
         self.chunks = chunks or []
+        self.source = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def __getstate__(self):
+        #The mapping stays with the original, copies get parsed chunks
+        state = self.__dict__.copy()
+        state["source"] = None
+        return state
     
     @classmethod
     def load(cls, handle):
         self = cls()
-        buffer = b""
-        while True:
-            c = handle.read(1)
-            if not c or c == b"\0":
-                break
-            buffer += c
+        try:
+            #Let the OS page the document in; chunk views point into the map
+            start = handle.tell()
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self.source = data
+        except (AttributeError, OSError, ValueError):
+            #Not a regular file (pipe, BytesIO, empty file...)
+            start = 0
+            data = handle.read()
+        
+        nul = data.find(b"\0", start)
+        if nul < 0:
+            nul = len(data)
         
-        self.text = buffer
-        while True:
-            data = handle.read(self.sDolDocEntry.size)
-            if not data:
-                break
-            chunkId, flags, size, refCount \
-                = self.sDolDocEntry.unpack(data)
-            data = handle.read(size)
+        self.text = data[start:nul]
+        buf = memoryview(data)
+        off = nul + 1
+        while off < len(buf):
+            try:
+                chunkId, flags, size, refCount \
+                    = self.sDolDocEntryUnpackFrom(buf, off)
+            except struct.error as e:
+                raise DolDocError(f"Truncated chunk header at {off}!") from e
+            off += self.sDolDocEntrySize
             self.chunks.append([
                 chunkId,
                 flags,
                 size,
                 refCount,
-                DolDocEntry.fromBytes(data)
+                DolDocLazyEntry(buf[off:off + size])
             ])
+            off += size
+        return self
+    
+    def parseAll(self, executor = None):
+        #Chunks are independent, so they can be decoded on an executor
+        pending = [chunk[4] for chunk in self.chunks if chunk[4].parsed is None]
+        if executor is None:
+            for lazy in pending:
+                lazy.parse()
+            return self
+        
+        #Payloads are views into the document, workers get copies
+        entries = executor.map(
+            DolDocEntry.fromBytes,
+            [bytes(lazy.raw) for lazy in pending]
+        )
+        for lazy, entry in zip(pending, entries):
+            lazy.parsed = entry
+            lazy.raw = None
         return self
+    
+    def close(self):
+        #Unmaps the file, copying out whatever still points into it
+        if self.source is None:
+            return
+        for chunk in self.chunks:
+            if isinstance(chunk[4], DolDocLazyEntry):
+                chunk[4].detach()
+        self.source.close()
+        self.source = None
 
 if __name__ == "__main__":
     # create the top-level parser
@@ -632,16 +889,23 @@ if __name__ == "__main__":
 
     # List
     parser_list = subparsers.add_parser("l", help='a help')
-    parser_list.add_argument('file', nargs="+", type=argparse.FileType('rb'), help='Input file(s)')
+    parser_list.set_defaults(command="l")
+    parser_list.add_argument('file', nargs="+", help='Input file(s)')
 
     # Extract
     parser_extract = subparsers.add_parser("e", help='b help')
-    parser_extract.add_argument('file', nargs="+", type=argparse.FileType('rb'), help='Input file(s)')
-    parser_extract.add_argument('-o', '--output', nargs="+", type=argparse.FileType('rb'), help='Output directory')
+    parser_extract.set_defaults(command="e")
+    parser_extract.add_argument('file', nargs="+", help='Input file(s)')
+    parser_extract.add_argument('-o', '--output', help='Output directory')
 
     args = parser.parse_args()
     
-    for file in args.file:
-        print("# "+file.name)
-        dd = DolDoc.load(file)
-        file.close()
\ No newline at end of file
+    for filename in args.file:
+        print("# "+filename)
+        with open(filename, "rb") as file, DolDoc.load(file) as dd:
+            if args.command == "l":
+                for chunk in dd.chunks:
+                    for elm in chunk[4].iterElements():
+                        print(elm)
+            else:
+                dd.parseAll()
\ No newline at end of file
@@ -2,3 +2,4 @@
 for filename in ./tests/*.HC; do
     python3 ./DolDoc/DolDoc.py l ${filename}
 done
+python3 ./tests/PolyPt.py
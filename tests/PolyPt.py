@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+#Checks the PolyPt step decoder against hand packed payloads
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "DolDoc"))
+from DolDoc import DolDocElementPolyPt
+
+def pack(x, y, codes):
+    #3 bit codes, least significant bits first
+    bits = 0
+    for i, code in enumerate(codes):
+        bits |= code << (i * 3)
+    size = (len(codes) * 3 + 7) >> 3
+    return struct.pack("<iii", len(codes), x, y) + bits.to_bytes(size, "little")
+
+def decode(data):
+    elm = DolDocElementPolyPt.fromBytes("PolyPt", 0, data)
+    return list(elm.points)
+
+#Codes 0, 7, 3 pack to F8 00
+data = pack(10, 20, [0, 7, 3])
+assert data[12:] == b"\xf8\x00", data[12:]
+assert decode(data) == [(9, 19), (10, 20), (9, 20)], decode(data)
+
+#Every direction once, with codes straddling byte boundaries
+assert decode(pack(0, 0, range(8))) == [
+    (-1, -1), (-1, -2), (0, -3), (-1, -3),
+    (0, -3), (-1, -2), (-1, -1), (0, 0)
+], decode(pack(0, 0, range(8)))
+
+#No points
+assert decode(pack(5, 5, [])) == []